@@ -7,8 +7,7 @@ from database import get_db_connection
 class StockDataLoader:
     def load_companies(self, companies_df: pd.DataFrame):
         """Bulk load companies into database"""
-        conn = get_db_connection()
-        try:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 # Get existing symbols for conflict check
                 cur.execute("SELECT symbol FROM companies")
@@ -28,13 +27,10 @@ class StockDataLoader:
                               page_size=1000
                               )
             conn.commit()
-        finally:
-            conn.close()
 
     def load_prices(self, prices_df: pd.DataFrame):
         """Bulk load stock prices with pattern detection"""
-        conn = get_db_connection()
-        try:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 # Get company ID mapping
                 cur.execute("SELECT id, symbol FROM companies")
@@ -72,6 +68,4 @@ class StockDataLoader:
                               price_data,
                               page_size=1000
                               )
-            conn.commit()
-        finally:
-            conn.close()
\ No newline at end of file
+            conn.commit()
\ No newline at end of file
@@ -1,3 +1,4 @@
+import threading
 import psycopg2
 from psycopg2 import pool
 from contextlib import contextmanager
@@ -5,33 +6,45 @@ from contextlib import contextmanager
 
 class DBPool:
     _instance = None
+    _lock = threading.Lock()
 
-    def __init__(self, min_conn=2, max_conn=10):
-        if not DBPool._instance:
-            DBPool._instance = psycopg2.pool.ThreadedConnectionPool(
-                min_conn, max_conn,
-                user="your_user",
-                password="your_password",
-                host="your_host",
-                port="5432",
-                database="stock_db"
-            )
+    @classmethod
+    def get_pool(cls, min_conn=4, max_conn=32):
+        if cls._instance is None:
+            with cls._lock:
+                # Re-check under the lock so concurrent first callers build one pool
+                if cls._instance is None:
+                    cls._instance = psycopg2.pool.ThreadedConnectionPool(
+                        min_conn, max_conn,
+                        user="your_user",
+                        password="your_password",
+                        host="your_host",
+                        port="5432",
+                        database="stock_db"
+                    )
+        return cls._instance
 
     @classmethod
     def get_connection(cls):
-        if not cls._instance:
-            cls(min_conn=2, max_conn=10)
-        return cls._instance.getconn()
+        return cls.get_pool().getconn()
 
     @classmethod
-    def return_connection(cls, conn):
-        cls._instance.putconn(conn)
+    def return_connection(cls, conn, close=False):
+        cls.get_pool().putconn(conn, close=close)
 
 
 @contextmanager
 def get_db_connection():
     conn = DBPool.get_connection()
+    broken = False
     try:
         yield conn
+    except Exception:
+        # Roll back before re-pooling; a connection that cannot roll back is discarded
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
     finally:
-        DBPool.return_connection(conn)
\ No newline at end of file
+        DBPool.return_connection(conn, close=broken or bool(conn.closed))
\ No newline at end of file
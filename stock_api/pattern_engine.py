@@ -2,7 +2,7 @@ import talib
 import numpy as np
 from typing import Dict, List
 from datetime import date
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_values
 from database import get_db_connection
 
 
@@ -32,32 +32,36 @@ class PatternEngine:
 
     def save_patterns_to_db(self, patterns: Dict[int, np.array], company_id: int, dates: List[date]):
         """Bulk save detected patterns to database"""
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                # Prepare batch data
-                pattern_data = []
-                for i, day_date in enumerate(dates):
-                    for pattern_id, pattern_results in patterns.items():
-                        if pattern_results[i] != 0:
-                            pattern_data.append((
-                                company_id,
-                                day_date,
-                                pattern_id,
-                                abs(pattern_results[i])  # Confidence score
-                            ))
+        if not patterns:
+            return
+        pattern_ids = np.array(sorted(patterns))
+        mat = np.stack([patterns[pattern_id] for pattern_id in pattern_ids])
+        pids, idxs = np.nonzero(mat)
+        if len(pids) == 0:
+            return
+
+        # One row per non-zero (pattern, day) cell: company, date, pattern id, confidence
+        dates_np = np.asarray(dates, dtype=object)
+        pattern_data = list(zip(
+            [company_id] * len(pids),
+            dates_np[idxs].tolist(),
+            pattern_ids[pids].tolist(),
+            np.abs(mat[pids, idxs]).tolist()
+        ))
 
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
                 # Bulk insert
-                execute_batch(cur,
-                              """INSERT INTO stock_price_patterns 
-                              (stock_price_id, date, pattern_id, confidence)
-                              SELECT sp.id, %s, %s, %s
-                              FROM stock_prices sp
-                              WHERE sp.company_id = %s AND sp.date = %s
-                              ON CONFLICT DO NOTHING""",
-                              pattern_data,
-                              page_size=1000
-                              )
-            conn.commit()
-        finally:
-            conn.close()
\ No newline at end of file
+                execute_values(cur,
+                               """INSERT INTO stock_price_patterns 
+                               (stock_price_id, date, pattern_id, confidence)
+                               SELECT sp.id, v.date, v.pattern_id, v.confidence
+                               FROM (VALUES %s) AS v (company_id, date, pattern_id, confidence)
+                               JOIN stock_prices sp
+                               ON sp.company_id = v.company_id AND sp.date = v.date
+                               ON CONFLICT DO NOTHING""",
+                               pattern_data,
+                               template="(%s, %s::date, %s, %s)",
+                               page_size=5000
+                               )
+            conn.commit()
\ No newline at end of file
@@ -1,14 +1,19 @@
 import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
 import requests
-import pandas as pd
-from io import StringIO
+import numpy as np
+from io import BytesIO, StringIO
 import warnings
 from datetime import datetime, timedelta
 import logging
-from sqlalchemy import create_engine, Table, Column, Integer, String, Float, Date, MetaData, inspect, UniqueConstraint, TEXT
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine, Table, Column, Integer, String, Float, Date, MetaData, inspect, UniqueConstraint, Index
 from sqlalchemy.sql import text
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 import talib
 from dotenv import load_dotenv
 
@@ -27,6 +32,27 @@ def get_engine():
         db_url = db_url.replace("postgres://", "postgresql://", 1)
     return create_engine(db_url, pool_pre_ping=True, pool_recycle=3600)
 
+BHAVCOPY_URL = 'https://nsearchives.nseindia.com/products/content/sec_bhavdata_full_{date_str}.csv'
+NSE_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+BHAVCOPY_COLUMNS = {
+    'SYMBOL': 'Symbol', 'DATE1': 'Date', 'OPEN_PRICE': 'Open',
+    'HIGH_PRICE': 'High', 'LOW_PRICE': 'Low', 'CLOSE_PRICE': 'Close',
+    'PREV_CLOSE': 'prev_close', 'AVG_PRICE': 'avg_price',
+    'TTL_TRD_QNTY': 'Volume'
+}
+PRICE_TABLE = 'daily_prices'
+COMMON_TABLE = 'common_stock_data'
+STAGING_TABLE = 'tmp_bhavcopy'
+PARQUET_ROOT = 'data/bhav'
+
+STOCK_COLUMN_SOURCES = {
+    'symbol': 'Symbol', 'date': 'Date', 'open': 'Open', 'high': 'High',
+    'low': 'Low', 'close': 'Close', 'volume': 'Volume', 'prev_close': 'prev_close',
+    'avg_price': 'avg_price', 'pattern_value': 'pattern_value',
+}
+STOCK_COLUMNS = list(STOCK_COLUMN_SOURCES)
+
 class CandlePatternRecognizer:
     def __init__(self):
         self.pattern_names = [
@@ -48,15 +74,25 @@ class CandlePatternRecognizer:
             'Doji': talib.CDLDOJI,
             'LongLeggedDoji': talib.CDLLONGLEGGEDDOJI,
         }
+        # One entry per distinct TA-Lib kernel with every bit column it feeds.
+        kernels = {}
+        for i, name in enumerate(self.pattern_names):
+            kernels.setdefault(self.patterns[name], []).append(i)
+        self.kernels = tuple((func, np.array(slots)) for func, slots in kernels.items())
 
     def apply_and_encode_patterns(self, df):
         df.columns = df.columns.str.strip()
-        for name in self.pattern_names:
-            df[name] = (self.patterns[name](df['Open'], df['High'], df['Low'], df['Close']) != 0).astype(int)
-        df['pattern_value'] = df[self.pattern_names].astype(str).agg(''.join, axis=1).apply(lambda x: int(x, 2))
-        df['matched_patterns'] = df[self.pattern_names].apply(
-            lambda row: [pattern for pattern, val in row.items() if val == 1], axis=1
-        )
+        o = df['Open'].to_numpy(np.float64, copy=False)
+        h = df['High'].to_numpy(np.float64, copy=False)
+        l = df['Low'].to_numpy(np.float64, copy=False)
+        c = df['Close'].to_numpy(np.float64, copy=False)
+        pattern_names = self.pattern_names
+        mat = np.empty((len(df), len(pattern_names)), dtype=np.uint8)
+        for func, slots in self.kernels:
+            mat[:, slots] = (func(o, h, l, c) != 0)[:, None]
+        df[pattern_names] = mat
+        weights = (1 << np.arange(len(pattern_names) - 1, -1, -1)).astype(np.uint16)
+        df['pattern_value'] = mat.astype(np.uint16) @ weights
         return df
 
 class StockDatabaseManager:
@@ -64,194 +100,343 @@ class StockDatabaseManager:
         self.engine = get_engine()
         self.metadata = MetaData()
         self.pattern_recognizer = CandlePatternRecognizer()
+        self.existing_tables_cache = set(inspect(self.engine).get_table_names())
 
-    def get_table_names(self):
-        inspector = inspect(self.engine)
-        return inspector.get_table_names()
+    def check_table_exists(self, table_name):
+        return table_name in self.existing_tables_cache
 
     def create_indexes(self, table_name):
+        # (symbol, date, pattern_value) also serves symbol and (symbol, date) prefix lookups.
+        redundant = ['symbol', 'date', 'pattern_value', 'symbol_date', 'symbol_pattern']
         try:
-            with self.engine.connect() as conn:
+            with self.engine.begin() as conn:
                 index_queries = [
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_symbol ON {table_name} (symbol);',
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_date ON {table_name} (date);',
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_pattern_value ON {table_name} (pattern_value);',
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_symbol_date ON {table_name} (symbol, date);',
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_symbol_pattern ON {table_name} (symbol, pattern_value);',
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_date_pattern ON {table_name} (date, pattern_value);',
-                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_symbol_date_pattern ON {table_name} (symbol, date, pattern_value);'
+                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_symbol_date_pattern ON {table_name} (symbol, date, pattern_value);',
+                    f'CREATE INDEX IF NOT EXISTS idx_{table_name}_date_pattern ON {table_name} (date, pattern_value);'
+                ]
+                index_queries += [f'DROP INDEX IF EXISTS idx_{table_name}_{suffix};' for suffix in redundant]
+                index_queries += [
+                    f'DROP INDEX IF EXISTS ix_{table_name}_{column};' for column in ('symbol', 'date', 'pattern_value')
                 ]
-                for q in index_queries:
-                    conn.execute(text(q))
+                conn.execute(text("\n".join(index_queries)))
         except Exception as e:
             logging.error(f"⚠️ Failed to create indexes on {table_name}: {e}")
 
+    def consolidate_indexes(self):
+        for table_name in (PRICE_TABLE, COMMON_TABLE):
+            if self.check_table_exists(table_name):
+                self.create_indexes(table_name)
+
+    def stock_columns(self, table_name):
+        return [
+            Column('symbol', String(20)),
+            Column('date', Date),
+            Column('open', Float),
+            Column('high', Float),
+            Column('low', Float),
+            Column('close', Float),
+            Column('volume', Float),
+            Column('prev_close', Float),
+            Column('avg_price', Float),
+            Column('pattern_value', Integer),
+            UniqueConstraint('symbol', 'date', name=f'uq_{table_name}'),
+            Index(f'idx_{table_name}_symbol_date_pattern', 'symbol', 'date', 'pattern_value'),
+            Index(f'idx_{table_name}_date_pattern', 'date', 'pattern_value')
+        ]
+
     def create_table(self, table_name):
+        if self.check_table_exists(table_name):
+            return True
         try:
-            columns = [
-                Column('id', Integer, primary_key=True),
-                Column('symbol', String(20), index=True),
-                Column('date', Date, index=True),
-                Column('open', Float),
-                Column('high', Float),
-                Column('low', Float),
-                Column('close', Float),
-                Column('volume', Float),
-                Column('prev_close', Float),
-                Column('avg_price', Float),
-                Column('pattern_value', Integer, index=True),
-                Column('matched_patterns', TEXT),
-                UniqueConstraint('symbol', 'date', name=f'uq_{table_name}')
-            ]
+            columns = [Column('id', Integer, primary_key=True)] + self.stock_columns(table_name)
             Table(table_name, self.metadata, *columns)
             self.metadata.create_all(self.engine)
-            self.create_indexes(table_name)
+            self.existing_tables_cache.add(table_name)
+            self.create_pattern_views()
             return True
         except Exception as e:
             logging.error(f"⚠️ Error creating table {table_name}: {e}")
             return False
 
-    def insert_data(self, symbol, data):
-        table_name = f"stock_{symbol.lower()}"
+    def create_price_table(self):
+        # Hypertable unique keys must include the partition column, so there is no surrogate id here.
+        if self.check_table_exists(PRICE_TABLE):
+            return True
+        try:
+            Table(PRICE_TABLE, self.metadata, *self.stock_columns(PRICE_TABLE))
+            self.metadata.create_all(self.engine)
+            self.existing_tables_cache.add(PRICE_TABLE)
+        except Exception as e:
+            logging.error(f"⚠️ Error creating table {PRICE_TABLE}: {e}")
+            return False
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(
+                    f"SELECT create_hypertable('{PRICE_TABLE}', 'date', "
+                    f"chunk_time_interval => INTERVAL '1 month', if_not_exists => TRUE, migrate_data => TRUE)"
+                ))
+                conn.execute(text(
+                    f"ALTER TABLE {PRICE_TABLE} SET (timescaledb.compress, "
+                    f"timescaledb.compress_segmentby = 'symbol', timescaledb.compress_orderby = 'date')"
+                ))
+                conn.execute(text(
+                    f"SELECT add_compression_policy('{PRICE_TABLE}', INTERVAL '7 days', if_not_exists => TRUE)"
+                ))
+        except Exception as e:
+            logging.error(f"⚠️ TimescaleDB setup failed, {PRICE_TABLE} stays a plain table: {e}")
+        else:
+            try:
+                # Separate transaction: older TimescaleDB releases without sparse_index keep the rest of the setup.
+                with self.engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {PRICE_TABLE} SET (timescaledb.sparse_index = 'minmax(pattern_value)')"
+                    ))
+            except Exception as e:
+                logging.error(f"⚠️ Failed to add minmax sparse index on {PRICE_TABLE}.pattern_value: {e}")
+        self.create_pattern_views()
+        return True
+
+    def create_pattern_views(self):
+        names = ', '.join(f"'{name}'" for name in self.pattern_recognizer.pattern_names)
+        n_patterns = len(self.pattern_recognizer.pattern_names)
         try:
-            row = data.iloc[0]
-            insert_data = {
-                'symbol': symbol,
-                'date': datetime.strptime(row['Date'], '%d-%m-%Y').date(),
-                'open': float(row['Open']),
-                'high': float(row['High']),
-                'low': float(row['Low']),
-                'close': float(row['Close']),
-                'volume': float(row['Volume']),
-                'prev_close': float(row['prev_close']),
-                'avg_price': float(row['avg_price']),
-                'pattern_value': int(row['pattern_value']),
-                'matched_patterns': str(row['matched_patterns']),
-            }
-            keys = ', '.join(insert_data.keys())
-            values = ', '.join([f':{k}' for k in insert_data])
-            query = f"""
-                INSERT INTO {table_name} ({keys}) VALUES ({values})
-                ON CONFLICT (symbol, date) DO NOTHING
-            """
             with self.engine.begin() as conn:
-                conn.execute(text(query), insert_data)
+                # pattern_value bit (n - 1 - i) is set when pattern_names[i] matched.
+                conn.execute(text(f"""
+                    CREATE OR REPLACE FUNCTION decode_patterns(value INTEGER) RETURNS TEXT[] AS $$
+                        SELECT COALESCE(array_agg(p.name ORDER BY p.ord), '{{}}')
+                        FROM unnest(ARRAY[{names}]::TEXT[]) WITH ORDINALITY AS p(name, ord)
+                        WHERE value & (1 << ({n_patterns} - p.ord::INTEGER)) <> 0
+                    $$ LANGUAGE SQL IMMUTABLE
+                """))
+        except Exception as e:
+            logging.error(f"⚠️ Failed to create decode_patterns: {e}")
+            return
+        for table_name in (PRICE_TABLE, COMMON_TABLE):
+            if not self.check_table_exists(table_name):
+                continue
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text(f"""
+                        CREATE OR REPLACE VIEW v_{table_name} AS
+                        SELECT *, decode_patterns(pattern_value) AS matched FROM {table_name}
+                    """))
+            except Exception as e:
+                logging.error(f"⚠️ Failed to create pattern view on {table_name}: {e}")
+
+    def drop_matched_patterns(self):
+        for table_name in (PRICE_TABLE, COMMON_TABLE):
+            if not self.check_table_exists(table_name):
+                continue
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN IF EXISTS matched_patterns"))
+            except Exception as e:
+                logging.error(f"⚠️ Failed to drop matched_patterns from {table_name}: {e}")
+        self.create_pattern_views()
+
+    def copy_staging(self, cur, df):
+        copy_df = df[list(STOCK_COLUMN_SOURCES.values())].rename(
+            columns={src: col for col, src in STOCK_COLUMN_SOURCES.items()}
+        )
+        columns = ', '.join(STOCK_COLUMNS)
+        buf = StringIO()
+        copy_df.to_csv(buf, index=False, header=False, columns=STOCK_COLUMNS)
+        buf.seek(0)
+        cur.execute(
+            f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {COMMON_TABLE} WITH NO DATA"
+        )
+        cur.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH CSV", buf)
+        return len(copy_df)
+
+    def insert_from_staging(self, cur, table_name, where=''):
+        columns = ', '.join(STOCK_COLUMNS)
+        cur.execute(
+            f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {STAGING_TABLE} {where} "
+            f"ON CONFLICT (symbol, date) DO NOTHING"
+        )
+        return cur.rowcount
+
+    def insert_all_for_date(self, conn, df, include_prices=True):
+        self.create_table(COMMON_TABLE)
+        if include_prices:
+            self.create_price_table()
+        try:
+            # One COPY per day feeds both tables; common_stock_data only keeps rows with a pattern.
+            with conn.cursor() as cur:
+                self.copy_staging(cur, df)
+                n_common = self.insert_from_staging(cur, COMMON_TABLE, 'WHERE pattern_value <> 0')
+                n_prices = self.insert_from_staging(cur, PRICE_TABLE) if include_prices else None
+            conn.commit()
+            if n_prices is None:
+                logging.info(f"✅ Inserted {n_common} rows into {COMMON_TABLE}")
+            else:
+                logging.info(f"✅ Inserted {n_common} rows into {COMMON_TABLE} and {n_prices} rows into {PRICE_TABLE}")
             return True
         except Exception as e:
-            logging.error(f"⚠️ Insert failed for {symbol}: {e}")
+            logging.error(f"⚠️ Insert failed, date rolled back: {e}")
+            try:
+                conn.rollback()
+            except Exception as rollback_error:
+                logging.error(f"⚠️ Rollback failed, connection is unusable: {rollback_error}")
             return False
 
-    def bulk_insert_common(self, df):
-        table_name = "common_stock_data"
-        self.create_table(table_name)
-        pattern_cols = self.pattern_recognizer.pattern_names
-        df_patterns = df[df[pattern_cols].any(axis=1)]
-        if df_patterns.empty:
-            return
-        records = []
-        df_patterns.reset_index(drop=True, inplace=True)
-        for _, row in df_patterns.iterrows():
-            record = {
-                'symbol': row['Symbol'],
-                'date': datetime.strptime(row['Date'], '%d-%m-%Y').date(),
-                'open': float(row['Open']),
-                'high': float(row['High']),
-                'low': float(row['Low']),
-                'close': float(row['Close']),
-                'volume': float(row['Volume']),
-                'prev_close': float(row['prev_close']),
-                'avg_price': float(row['avg_price']),
-                'pattern_value': int(row['pattern_value']),
-                'matched_patterns': str(row['matched_patterns']),
-            }
-            records.append(record)
+class ParquetPriceStore:
+    def __init__(self, root=PARQUET_ROOT):
+        self.root = root
+
+    def write(self, df):
+        prices = df[list(STOCK_COLUMN_SOURCES.values())]
+        table = pa.Table.from_pandas(prices, preserve_index=False)
         try:
-            table = Table(table_name, self.metadata, autoload_with=self.engine)
-            stmt = pg_insert(table).values(records)
-            stmt = stmt.on_conflict_do_nothing(index_elements=['symbol', 'date'])
-            with self.engine.begin() as conn:
-                conn.execute(stmt)
-            logging.info(f"✅ Bulk inserted {len(records)} records into {table_name}")
+            pq.write_to_dataset(
+                table, root_path=self.root, partition_cols=['Date'],
+                compression='zstd', existing_data_behavior='delete_matching'
+            )
+            logging.info(f"✅ Wrote {len(prices)} rows to {self.root}")
+            return True
         except Exception as e:
-            logging.error(f"⚠️ Bulk insert failed for {table_name}: {e}")
+            logging.error(f"⚠️ Parquet write failed for {self.root}: {e}")
+            return False
+
+    def scan(self):
+        return pl.scan_parquet(f"{self.root}/**/*.parquet", hive_partitioning=True)
+
+    def scan_symbol(self, symbol):
+        return self.scan().filter(pl.col('Symbol') == symbol)
 
 class StockDataDownloader:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, price_store=None, max_concurrent_downloads=32, max_workers=None):
         self.db_manager = db_manager
+        self.price_store = price_store
         self.pattern_recognizer = db_manager.pattern_recognizer
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.max_workers = max_workers or os.cpu_count()
 
     def is_weekend(self, date_str):
         return datetime.strptime(date_str, "%d%m%Y").weekday() >= 5
 
     def download_csv(self, date_str):
-        url = f'https://nsearchives.nseindia.com/products/content/sec_bhavdata_full_{date_str}.csv'
         try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(url, headers=headers)
+            response = requests.get(BHAVCOPY_URL.format(date_str=date_str), headers=NSE_HEADERS)
             if response.status_code == 200:
                 return StringIO(response.content.decode('utf-8'))
             return None
         except:
             return None
 
-    def clean_bhavcopy(self, df):
-        df.columns = df.columns.str.strip()
-        for col in df.select_dtypes(include='object').columns:
-            df[col] = df[col].str.strip()
-        df.drop(columns=['LAST_PRICE', 'TURNOVER_LACS','NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER'], inplace=True, errors='ignore')
-        df.rename(columns={
-            'SYMBOL': 'Symbol', 'DATE1': 'Date', 'OPEN_PRICE': 'Open',
-            'HIGH_PRICE': 'High', 'LOW_PRICE': 'Low', 'CLOSE_PRICE': 'Close',
-            'PREV_CLOSE': 'prev_close', 'AVG_PRICE': 'avg_price',
-            'TTL_TRD_QNTY': 'Volume'
-        }, inplace=True)
-        df['Date'] = pd.to_datetime(df['Date'], format='%d-%b-%Y').dt.strftime('%d-%m-%Y')
-        df = df[df['SERIES']=='EQ']
-        df.reset_index(drop=True, inplace=True)
-        return df
+    async def _download_one(self, session, semaphore, date_str):
+        async with semaphore:
+            try:
+                async with session.get(BHAVCOPY_URL.format(date_str=date_str)) as response:
+                    if response.status == 200:
+                        return date_str, await response.read()
+            except Exception as e:
+                logging.error(f"⚠️ Download failed for {date_str}: {e}")
+        return date_str, None
+
+    async def download_many(self, dates):
+        semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+        async with aiohttp.ClientSession(headers=NSE_HEADERS) as session:
+            tasks = [self._download_one(session, semaphore, d) for d in dates]
+            for future in asyncio.as_completed(tasks):
+                yield await future
+
+    async def _process_downloads(self, dates):
+        loop = asyncio.get_running_loop()
+        write_lock = asyncio.Lock()
+
+        async def handle(pool, date_str, content):
+            try:
+                df = await loop.run_in_executor(pool, prepare_bhavcopy, content)
+                async with write_lock:
+                    await asyncio.to_thread(self.store_frame, date_str, df)
+            except Exception as e:
+                logging.error(f"⚠️ Error processing {date_str}: {e}")
+
+        # Spawned workers never inherit the engine, the event loop or aiohttp's threads.
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+        ) as pool:
+            tasks = []
+            async for date_str, content in self.download_many(dates):
+                if content is not None:
+                    logging.info(f"⬇️ Downloaded {date_str}")
+                    tasks.append(asyncio.create_task(handle(pool, date_str, content)))
+            await asyncio.gather(*tasks)
+
+    @staticmethod
+    def clean_bhavcopy(csv_file):
+        raw = pl.read_csv(csv_file, infer_schema_length=0)
+        df = (
+            raw.lazy()
+            .rename({col: col.strip() for col in raw.columns})
+            .with_columns(pl.all().str.strip_chars())
+            .filter(pl.col('SERIES') == 'EQ')
+            .drop(['LAST_PRICE', 'TURNOVER_LACS', 'NO_OF_TRADES', 'DELIV_QTY', 'DELIV_PER'], strict=False)
+            .rename(BHAVCOPY_COLUMNS)
+            .with_columns(
+                pl.col('Date').str.strptime(pl.Date, '%d-%b-%Y'),
+                pl.col(['Open', 'High', 'Low', 'Close', 'prev_close', 'avg_price', 'Volume']).cast(pl.Float64),
+            )
+            .collect()
+        )
+        # Date stays a plain datetime.date, which every writer passes through unchanged.
+        return df.to_pandas(date_as_object=True)
 
     def process_single_date(self, date_str):
         if self.is_weekend(date_str): return
         csv_file = self.download_csv(date_str)
         if not csv_file: return
+        self.process_csv(date_str, csv_file)
 
+    def process_csv(self, date_str, csv_file):
         try:
-            df = pd.read_csv(csv_file)
-            df = self.clean_bhavcopy(df)
+            df = self.clean_bhavcopy(csv_file)
             df = self.pattern_recognizer.apply_and_encode_patterns(df)
-            self.db_manager.bulk_insert_common(df)
-
-            existing_tables = set(self.db_manager.get_table_names())
-            for symbol in df['Symbol'].unique():
-                try:
-                    table_name = f"stock_{symbol.lower()}"
-                    if table_name not in existing_tables:
-                        self.db_manager.create_table(table_name)
-                        print(table_name)
-                except:
-                    print('Creating Error',f"stock_{symbol.lower()}")
-                    continue
-
-            for symbol, group in df.groupby("Symbol"):
-                try:
-                    self.db_manager.insert_data(symbol, group)
-                    print(symbol)
-                except:
-                    print('Error inserting data', symbol)
-                    continue
+            self.store_frame(date_str, df)
         except Exception as e:
             logging.error(f"⚠️ Error processing {date_str}: {e}")
 
+    def store_frame(self, date_str, df):
+        # A fresh pool checkout per date; pool_pre_ping replaces connections that dropped in between.
+        conn = self.db_manager.engine.raw_connection()
+        try:
+            stored = self.db_manager.insert_all_for_date(conn, df, include_prices=self.price_store is None)
+        finally:
+            conn.close()
+        # The Parquet partition is only written once the date's DB transaction has committed.
+        if stored and self.price_store is not None:
+            stored = self.price_store.write(df)
+        if stored:
+            logging.info(f"✅ Stored {date_str}")
+
     def process_date_range(self, start_date, end_date):
         start = datetime.strptime(start_date, "%d%m%Y")
         end = datetime.strptime(end_date, "%d%m%Y")
+        dates = []
         current = start
         while current <= end:
-            print(current)
-            self.process_single_date(current.strftime("%d%m%Y"))
+            date_str = current.strftime("%d%m%Y")
+            if not self.is_weekend(date_str):
+                dates.append(date_str)
             current += timedelta(days=1)
+        asyncio.run(self._process_downloads(dates))
+
+_worker_recognizer = None
+
+def prepare_bhavcopy(content):
+    """Clean a downloaded bhavcopy and encode its patterns inside a pool worker."""
+    global _worker_recognizer
+    if _worker_recognizer is None:
+        _worker_recognizer = CandlePatternRecognizer()
+    df = StockDataDownloader.clean_bhavcopy(BytesIO(content))
+    return _worker_recognizer.apply_and_encode_patterns(df)
 
 if __name__ == "__main__":
     db_manager = StockDatabaseManager()
-    downloader = StockDataDownloader(db_manager)
+    db_manager.drop_matched_patterns()
+    db_manager.consolidate_indexes()
+    downloader = StockDataDownloader(db_manager, price_store=ParquetPriceStore())
     downloader.process_date_range("01072025", datetime.now().strftime("%d%m%Y"))